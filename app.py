@@ -1,12 +1,20 @@
+import hashlib
+import logging
+import os
+from collections import Counter
+import pandas as pd
 import streamlit as st
-from decision_tree import decision_trees, get_question, get_options, evaluate_answer
-from utils import generate_recommendations, generate_checklist
-from llm_assessment import (
-    analyze_uploaded_evidence, 
-    evaluate_open_text_compliance,
-    generate_detailed_recommendations,
-    ai_assistant_response
+from decision_tree import (
+    decision_trees, get_question, get_options, evaluate_answer,
+    CLAUSE_IDS, TOTAL_CLAUSES, TERMINAL_STEPS,
+    CLAUSE_REQUIREMENTS, CLAUSE_TIPS, COMMON_PITFALLS
 )
+from utils import Analysis, compile_report
+# llm_assessment (and the OpenAI SDK) is imported inside the handlers that
+# need it, so structured-only sessions never pay for it
+
+# No-op after the first run; set LOG_LEVEL=DEBUG to see raw LLM responses
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 
 # Initialize session state for clause index, step, responses, and control flags
 def init_session_state():
@@ -16,7 +24,10 @@ def init_session_state():
         st.session_state.responses = {}
         st.session_state.last_verdict = False
         st.session_state.open_ended_responses = {}
+        st.session_state.open_ended_scores = {}
+        st.session_state.open_ended_feedback = {}
         st.session_state.evidence_analysis = {}
+        st.session_state.evidence_hash = {}
         st.session_state.previous_answers = {}
     if "form_submitted" not in st.session_state:
         st.session_state.form_submitted = False
@@ -32,7 +43,8 @@ def handle_form_submit():
 # Restart the entire assessment
 def restart_assessment():
     for key in ["clause_idx", "step", "responses", "last_verdict", "form_submitted", 
-                "open_ended_responses", "evidence_analysis", "previous_answers"]:
+                "open_ended_responses", "open_ended_scores", "open_ended_feedback",
+                "evidence_analysis", "evidence_hash", "previous_answers"]:
         if key in st.session_state:
             del st.session_state[key]
     st.rerun()
@@ -57,19 +69,10 @@ def switch_assessment_mode(mode):
     st.session_state.assessment_mode = mode
     st.rerun()  # Add this line to immediately refresh the UI
 
-# Check if current step is a terminal step (leads to verdict)
-def is_terminal_step(cid, step):
-    current_options = decision_trees[cid]["steps"][step]["options"]
-    return any(isinstance(target, dict) and "verdict" in target 
-              for target in current_options.values())
-
 # Begin
 st.set_page_config(page_title="levnertech", layout="wide")
 init_session_state()
 
-clause_ids = list(decision_trees.keys())
-total_clauses = len(clause_ids)
-
 
 # Header and navigation
 st.title("ISO 27001 Gap Assessment")
@@ -83,6 +86,23 @@ with col3:
         toggle_ai_assistant()
 
 
+# Render a list as a single markdown element rather than one element per item
+def write_bullets(items):
+    if items:
+        st.markdown("\n".join(f"- {item}" for item in items))
+
+
+# Row style for the results table, matching the success/warning/error colours
+def color_verdict(row):
+    if row["Verdict"] == "Complied":
+        style = "background-color: rgba(33, 195, 84, 0.1)"
+    elif row["Verdict"] in ("Minor NC", "Opportunity for Improvement"):
+        style = "background-color: rgba(255, 189, 69, 0.1)"
+    else:
+        style = "background-color: rgba(255, 43, 43, 0.1)"
+    return [style] * len(row)
+
+
 def display_analysis(analysis):
     st.write(f"**Compliance Level**: {analysis.get('compliance_level', 'Unknown')}")
 
@@ -93,22 +113,19 @@ def display_analysis(analysis):
 
     st.write("**Matched Requirements:**")
     if matched:
-        for req in matched:
-            st.write(f"- {req}")
+        write_bullets(matched)
     else:
         st.write("_No matched requirements found._")
 
     st.write("**Missing Requirements:**")
     if missing:
-        for req in missing:
-            st.write(f"- {req}")
+        write_bullets(missing)
     else:
         st.write("_No missing requirements detected._")
 
     st.write("**Suggestions for Improvement:**")
     if suggestions:
-        for suggestion in suggestions:
-            st.write(f"- {suggestion}")
+        write_bullets(suggestions)
     else:
         st.write("_No suggestions provided._")
 
@@ -118,28 +135,166 @@ def display_analysis(analysis):
     else:
         st.write("_No overall assessment available._")
 
-# AI Assistant panel
-if st.session_state.show_ai_assistant:
-    with st.expander("ISO 27001 AI Assistant", expanded=True):
-        cid = clause_ids[st.session_state.clause_idx] if st.session_state.clause_idx < total_clauses else None
-        clause_context = f"{cid}: {decision_trees[cid]['title']}" if cid else None
+# Sidebar insights; a fragment so it is not rebuilt by reruns scoped to other fragments
+@st.fragment
+def render_sidebar():
+    st.title("ISO 27001 Insights")
+    
+    # Show current clause insights
+    if st.session_state.clause_idx < TOTAL_CLAUSES:
+        cid = CLAUSE_IDS[st.session_state.clause_idx]
+        
+        # Display clause tips
+        st.subheader(f"Tips for Clause {cid}")
+        if cid in CLAUSE_TIPS:
+            for tip in CLAUSE_TIPS[cid]:
+                st.info(tip)
+        
+        # Display common pitfalls
+        st.subheader("Common Pitfalls")
+        if cid in COMMON_PITFALLS:
+            for pitfall in COMMON_PITFALLS[cid]:
+                st.warning(pitfall)
+    
+    # Show overall progress
+    st.subheader("Assessment Progress")
+    completed = sum(1 for _ in st.session_state.responses.items())
+    st.progress(completed / TOTAL_CLAUSES, text=f"{completed}/{TOTAL_CLAUSES} clauses assessed")
+    
+    # Show completed clauses
+    if completed > 0:
+        st.subheader("Completed Clauses")
+        lines = []
+        for cid, verdict in st.session_state.responses.items():
+            if verdict == "Complied":
+                lines.append(f":green[✓ {cid}]")
+            elif verdict in ("Minor NC", "Opportunity for Improvement"):
+                lines.append(f":orange[⚠ {cid}]")
+            else:
+                lines.append(f":red[✗ {cid}]")
+        st.markdown("  \n".join(lines))
+
+    # Add quick reference
+    with st.expander("ISO 27001 Quick Reference"):
+        st.write("""
+        **Clause 4: Context of the Organization**
+        - 4.1: Understanding the organization and its context
+        - 4.2: Understanding the needs and expectations of interested parties
+        - 4.3: Determining the scope of the ISMS
+        - 4.4: Information security management system
+        
+        **Key ISO 27001 Terms:**
+        - ISMS: Information Security Management System
+        - Risk: Effect of uncertainty on objectives
+        - Asset: Anything that has value to the organization
+        - Control: Measure that modifies risk
+        """)
+
+
+# Organization context and LLM recommendations; a fragment so typing and
+# clicking here does not rerun the whole results page
+@st.fragment
+def render_detailed_recommendations(assessment_data):
+    # Get organization context from user
+    org_context = st.text_area("Provide additional context about your organization for customized recommendations:", 
+                              placeholder="E.g., industry, size, risk profile, compliance priorities...")
+    
+    if st.button("Generate Detailed Recommendations"):
+        from llm_assessment import generate_detailed_recommendations
+        with st.spinner("Generating customized recommendations..."):
+            detailed_recs = generate_detailed_recommendations(assessment_data, org_context)
+            
+            # Display priority actions
+            st.write("**Priority Actions:**")
+            write_bullets(detailed_recs.get("priority_actions", []))
+            
+            # Display recommendations by clause
+            st.write("**Recommendations by Clause:**")
+            for clause_id, recs in detailed_recs.get("recommendations_by_clause", {}).items():
+                with st.expander(f"Clause {clause_id}"):
+                    st.write("**Actions:**")
+                    write_bullets(recs.get("actions", []))
+                    st.write(f"**Suggested Timeline:** {recs.get('timeline', 'Not specified')}")
+                    if recs.get("resources"):
+                        st.write("**Resources:**")
+                        write_bullets(recs.get("resources", []))
+            
+            # Display implementation strategy
+            st.write("**Implementation Strategy:**")
+            st.write(detailed_recs.get("implementation_strategy", "Address major non-conformities first, followed by minor ones."))
+            
+            # Display strengths
+            st.write("**Areas of Strength:**")
+            write_bullets(detailed_recs.get("areas_of_strength", []))
+
+
+# Structured-mode question; a fragment so picking an option reruns only the
+# question, while Submit triggers a full rerun
+@st.fragment
+def render_structured_question(cid, step, question, options):
+    # 1) Render pertanyaan dan tangkap apakah sudah submit
+    choice = st.radio(question, options, key=f"q_{cid}_{step}")
+    submitted = st.button("Submit", key=f"sub_{cid}_{step}")
+
+    # 2) Setelah submit: simpan jawaban & munculkan konteks
+    if submitted:
+        # simpan jawaban
+        st.session_state.previous_answers[question] = choice
+
+        #Proses jawaban untuk verdict atau lanjut step
+        result = evaluate_answer(cid, step, choice)
+        if not isinstance(result, str):
+            st.session_state.responses[cid] = result["verdict"]
+            st.session_state.last_verdict = True
+        else:
+            st.session_state.step = result
+
+        # reset flag form_submitted kalau masih pakai itu, lalu rerun
+        st.session_state.form_submitted = False
+        st.rerun()
 
+
+# AI Assistant panel; a fragment so asking a question reruns only this panel
+@st.fragment
+def render_ai_assistant(clause_context):
+    with st.expander("ISO 27001 AI Assistant", expanded=True):
         # user types, but we don't call the API until they click “Ask”
         user_query = st.text_input("Ask a question about ISO 27001 compliance:", key="assistant_query")
 
         # explicit “Ask” button
         if st.button("Ask", key="ask_ai") and user_query:
-            st.session_state.assistant_response = ai_assistant_response(user_query, clause_context)
+            try:
+                from llm_assessment import (
+                    get_cached_assistant_reply, remember_assistant_reply, stream_ai_assistant_response
+                )
+                reply = get_cached_assistant_reply(user_query, clause_context)
+                if reply is None:
+                    # stream tokens as they arrive; only completed replies are remembered
+                    reply = st.write_stream(stream_ai_assistant_response(user_query, clause_context))
+                    remember_assistant_reply(user_query, clause_context, reply)
+                else:
+                    st.write(reply)
+            except Exception as e:
+                reply = f"I'm sorry, I can't process that right now: {e}"
+                st.write(reply)
+            st.session_state.assistant_response = reply
+            st.divider()
 
-        # only display what we already fetched
-        if st.session_state.get("assistant_response"):
+        # otherwise only display what we already fetched
+        elif st.session_state.get("assistant_response"):
             st.write(st.session_state.assistant_response)
             st.divider()
 
         st.info("Ask questions about ISO 27001 requirements, implementation advice, or clarification about specific clauses.")
 
+
+if st.session_state.show_ai_assistant:
+    cid = CLAUSE_IDS[st.session_state.clause_idx] if st.session_state.clause_idx < TOTAL_CLAUSES else None
+    clause_context = f"{cid}: {decision_trees[cid]['title']}" if cid else None
+    render_ai_assistant(clause_context)
+
 # If all clauses done, show results
-if st.session_state.clause_idx >= total_clauses:
+if st.session_state.clause_idx >= TOTAL_CLAUSES:
     st.header("Assessment Results")
     
     # Display verdict summary
@@ -147,12 +302,11 @@ if st.session_state.clause_idx >= total_clauses:
     col1, col2, col3, col4 = st.columns(4)
     
     # Count verdicts
-    verdict_counts = {"Complied": 0, "Minor NC": 0, "Opportunity for Improvement": 0, "Major NC": 0}
-    for cid, verdict in st.session_state.responses.items():
-        if isinstance(verdict, list):
-            verdict = verdict[0]  # Handle list verdicts
-        if verdict in verdict_counts:
-            verdict_counts[verdict] += 1
+    # (list verdicts count towards their first entry; missing keys read as 0)
+    verdict_counts = Counter(
+        v[0] if isinstance(v, (list, tuple)) else v
+        for v in st.session_state.responses.values()
+    )
     
     # Display counters
     with col1:
@@ -166,28 +320,24 @@ if st.session_state.clause_idx >= total_clauses:
     
     # Show detailed results by clause
     st.subheader("Results by Clause")
-    for cid, verdict in st.session_state.responses.items():
-        if verdict == "Complied":
-            st.success(f"Clause {cid}: {verdict}")
-        elif verdict in ("Minor NC", "Opportunity for Improvement"):
-            st.warning(f"Clause {cid}: {verdict}")
-        else:
-            st.error(f"Clause {cid}: {verdict}")
-        
-        # Show evidence analysis if available
+    results_df = pd.DataFrame([
+        {"Clause": cid, "Verdict": ", ".join(verdict) if isinstance(verdict, (list, tuple)) else verdict}
+        for cid, verdict in st.session_state.responses.items()
+    ])
+    st.dataframe(results_df.style.apply(color_verdict, axis=1), hide_index=True)
+    
+    # Show evidence analysis if available, rendered only when toggled open
+    for cid in st.session_state.responses:
         if cid in st.session_state.evidence_analysis:
-            with st.expander(f"Evidence Analysis for Clause {cid}"):
+            if st.checkbox(f"Evidence Analysis for Clause {cid}", key=f"show_ev_{cid}"):
                 analysis = st.session_state.evidence_analysis[cid]
                 st.write(f"**Compliance Level**: {analysis.get('compliance_level', 'Not analyzed')}")
                 st.write("**Matched Requirements:**")
-                for req in analysis.get('matched_requirements', []):
-                    st.write(f"- {req}")
+                write_bullets(analysis.get('matched_requirements', []))
                 st.write("**Missing Requirements:**")
-                for req in analysis.get('missing_requirements', []):
-                    st.write(f"- {req}")
+                write_bullets(analysis.get('missing_requirements', []))
                 st.write("**Suggestions:**")
-                for sug in analysis.get('suggestions', []):
-                    st.write(f"- {sug}")
+                write_bullets(analysis.get('suggestions', []))
     
     # Generate LLM-enhanced recommendations
     st.subheader("Detailed Recommendations")
@@ -198,64 +348,26 @@ if st.session_state.clause_idx >= total_clauses:
         for cid, verdict in st.session_state.responses.items()
     ]
     
-    # Get organization context from user
-    org_context = st.text_area("Provide additional context about your organization for customized recommendations:", 
-                              placeholder="E.g., industry, size, risk profile, compliance priorities...")
-    
-    if st.button("Generate Detailed Recommendations"):
-        with st.spinner("Generating customized recommendations..."):
-            detailed_recs = generate_detailed_recommendations(assessment_data, org_context)
-            
-            # Display priority actions
-            st.write("**Priority Actions:**")
-            for action in detailed_recs.get("priority_actions", []):
-                st.write(f"- {action}")
-            
-            # Display recommendations by clause
-            st.write("**Recommendations by Clause:**")
-            for clause_id, recs in detailed_recs.get("recommendations_by_clause", {}).items():
-                with st.expander(f"Clause {clause_id}"):
-                    st.write("**Actions:**")
-                    for action in recs.get("actions", []):
-                        st.write(f"- {action}")
-                    st.write(f"**Suggested Timeline:** {recs.get('timeline', 'Not specified')}")
-                    if recs.get("resources"):
-                        st.write("**Resources:**")
-                        for res in recs.get("resources", []):
-                            st.write(f"- {res}")
-            
-            # Display implementation strategy
-            st.write("**Implementation Strategy:**")
-            st.write(detailed_recs.get("implementation_strategy", "Address major non-conformities first, followed by minor ones."))
-            
-            # Display strengths
-            st.write("**Areas of Strength:**")
-            for strength in detailed_recs.get("areas_of_strength", []):
-                st.write(f"- {strength}")
+    render_detailed_recommendations(assessment_data)
     
-    # Standard recommendations and checklist
+    # Standard recommendations and checklist; both derive from the verdicts
+    # alone (no LLM), so one compile_report call builds them together
+    report = compile_report([
+        Analysis(cid, verdict)
+        for cid, verdict in st.session_state.responses.items()
+    ])
     st.subheader("Quick Recommendations")
-    all_recs = []
-    for cid, verdict in st.session_state.responses.items():
-        analysis = {"clause": cid, "verdict": verdict}
-        all_recs.extend(generate_recommendations(analysis))
-    for rec in dict.fromkeys(all_recs):
-        st.write(f"- {rec}")
+    write_bullets(report["recommendations"])
 
     st.subheader("Mitigation Checklist")
-    checklist = generate_checklist([
-        {"clause": cid, "verdict": verdict}
-        for cid, verdict in st.session_state.responses.items()
-    ])
-    for item in checklist:
-        st.write(f"- {item}")
+    write_bullets(report["checklist"])
 
     if st.button("🔄 Restart Assessment", key="restart_end"):
         restart_assessment()
 
 # Otherwise, present current question
 else:
-    cid = clause_ids[st.session_state.clause_idx]
+    cid = CLAUSE_IDS[st.session_state.clause_idx]
     step = st.session_state.step
     title = decision_trees[cid]["title"]
 
@@ -275,59 +387,51 @@ else:
                     key="open_ended_btn"):
             switch_assessment_mode("open_ended")
     
-    # Evidence upload for either mode
-    with st.expander("Upload Evidence Documents"):
+    # Evidence upload for either mode; widgets are only built once the user opens it
+    if st.checkbox("Upload Evidence Documents", key=f"up_{cid}"):
         uploaded_file = st.file_uploader(f"Upload evidence for Clause {cid}", type=["pdf", "docx", "txt"])
         if uploaded_file is not None:
-            # Process the uploaded file
-            file_contents = uploaded_file.read()
-            # For text files, decode to string
-            if uploaded_file.type == "text/plain":
-                file_text = file_contents.decode('utf-8')
-            else:
-                # For simplicity, we'll just acknowledge receipt of non-text files
-                file_text = f"[Received file: {uploaded_file.name}]"
+            # Read and hash the file once per upload, not on every rerun
+            if uploaded_file.file_id != st.session_state.get("last_file_id"):
+                st.session_state.last_file_bytes = uploaded_file.read()
+                st.session_state.last_file_hash = hashlib.blake2b(
+                    st.session_state.last_file_bytes, digest_size=16
+                ).hexdigest()
+                st.session_state.last_file_id = uploaded_file.file_id
+            file_hash = st.session_state.last_file_hash
             
             if st.button("Analyze Document"):
-                with st.spinner("Analyzing document..."):
-                    analysis = analyze_uploaded_evidence(cid, file_text)
+                # Skip the LLM when this exact file was already analyzed for the clause
+                if (file_hash == st.session_state.evidence_hash.get(cid)
+                        and cid in st.session_state.evidence_analysis):
+                    analysis = st.session_state.evidence_analysis[cid]
+                else:
+                    # For text files, decode to string
+                    if uploaded_file.type == "text/plain":
+                        file_text = st.session_state.last_file_bytes.decode('utf-8')
+                    else:
+                        # For simplicity, we'll just acknowledge receipt of non-text files
+                        file_text = f"[Received file: {uploaded_file.name}]"
+                    from llm_assessment import analyze_uploaded_evidence
+                    with st.spinner("Analyzing document..."):
+                        analysis = analyze_uploaded_evidence(cid, file_text)
                     st.session_state.evidence_analysis[cid] = analysis
+                    st.session_state.evidence_hash[cid] = file_hash
 
-                    display_analysis(analysis)
+                display_analysis(analysis)
     
     # If structured assessment mode
     if st.session_state.assessment_mode == "structured":
         question = get_question(cid, step)
         options = get_options(cid, step)
-        terminal = is_terminal_step(cid, step)
+        terminal = (cid, step) in TERMINAL_STEPS
 
         if not st.session_state.last_verdict:
-            # 1) Render form dan tangkap apakah sudah submit
-            with st.form(key=f"form_{cid}_{step}"):
-                choice = st.radio(question, options)
-                submitted = st.form_submit_button("Submit")
-            
-            # 2) Setelah submit: simpan jawaban & munculkan konteks
-            if submitted:
-                # simpan jawaban
-                st.session_state.previous_answers[question] = choice
-
-                #Proses jawaban untuk verdict atau lanjut step
-                result = evaluate_answer(cid, step, choice)
-                if isinstance(result, dict) and "verdict" in result:
-                    st.session_state.responses[cid] = result["verdict"]
-                    st.session_state.last_verdict = True
-                else:
-                    st.session_state.step = result
-
-                # reset flag form_submitted kalau masih pakai itu, lalu rerun
-                st.session_state.form_submitted = False
-                st.rerun()
-
+            render_structured_question(cid, step, question, options)
         else:
             # Display the verdict when last_verdict is True
             verdict = st.session_state.responses[cid]
-            if isinstance(verdict, list):
+            if isinstance(verdict, (list, tuple)):
                 verdict = verdict[0]  # Handle list verdicts
                 
             if verdict == "Complied":
@@ -342,14 +446,8 @@ else:
     else:  # open_ended mode
         # Display clause details and requirements
         clause_description = f"Clause {cid}: {title}\n"
-        if cid in ["4.1", "4.2", "4.3", "4.4"]:
-            clause_requirements = {
-                "4.1": "The organization shall determine external and internal issues relevant to its purpose and strategic direction that affect its ability to achieve the intended outcome(s) of its ISMS.",
-                "4.2": "The organization shall determine interested parties relevant to the ISMS, and their requirements.",
-                "4.3": "The organization shall determine the boundaries and applicability of the ISMS to establish its scope.",
-                "4.4": "The organization shall establish, implement, maintain and continually improve an ISMS."
-            }
-            st.write(f"**Requirement:** {clause_requirements[cid]}")
+        if cid in CLAUSE_REQUIREMENTS:
+            st.write(f"**Requirement:** {CLAUSE_REQUIREMENTS[cid]}")
         
         # Only render the form if not already showing a verdict
         if not st.session_state.last_verdict:
@@ -377,23 +475,21 @@ else:
                     doc_context = str(st.session_state.evidence_analysis[cid])
                     
                 # Evaluate the response
+                from llm_assessment import evaluate_open_text_compliance
                 with st.spinner("Evaluating response..."):
                     verdict, scores, feedback = evaluate_open_text_compliance(cid, open_response, doc_context)
                     st.session_state.responses[cid] = verdict
+                    st.session_state.open_ended_scores[cid] = scores
+                    st.session_state.open_ended_feedback[cid] = feedback
                     st.session_state.last_verdict = True
                     st.rerun()
         else:
             # Display the verdict when last_verdict is True
             verdict = st.session_state.responses[cid]
-            open_response = st.session_state.open_ended_responses.get(cid, "")
-            
-            # Get document context if available
-            doc_context = None
-            if cid in st.session_state.evidence_analysis:
-                doc_context = str(st.session_state.evidence_analysis[cid])
-                
-            # Re-evaluate to get feedback
-            _, scores, feedback = evaluate_open_text_compliance(cid, open_response, doc_context)
+
+            # Reuse the feedback stored on submit instead of re-evaluating
+            scores = st.session_state.open_ended_scores.get(cid, {})
+            feedback = st.session_state.open_ended_feedback.get(cid, "")
             
             if verdict == "Complied":
                 st.success(f"Verdict for Clause {cid}: {verdict}")
@@ -402,9 +498,10 @@ else:
             else:
                 st.error(f"Verdict for Clause {cid}: {verdict}")
             
-            # Display feedback
-            st.subheader("Assessment Feedback")
-            st.write(feedback)
+            # Display feedback (absent when the verdict came from structured mode)
+            if feedback:
+                st.subheader("Assessment Feedback")
+                st.write(feedback)
             
             # Display scores if available
             if scores:
@@ -426,14 +523,14 @@ else:
     
     # Navigation buttons for either assessment mode
             # Show progress
-    progress_text = f"Clause {st.session_state.clause_idx + 1} of {total_clauses}"
-    st.progress((st.session_state.clause_idx + 1) / total_clauses, text=progress_text)
+    progress_text = f"Clause {st.session_state.clause_idx + 1} of {TOTAL_CLAUSES}"
+    st.progress((st.session_state.clause_idx + 1) / TOTAL_CLAUSES, text=progress_text)
     col1, col2 = st.columns(2)
     
     with col1:
         if st.session_state.last_verdict:
             # Only show the next clause button if a verdict has been reached
-            if st.session_state.clause_idx < total_clauses - 1:
+            if st.session_state.clause_idx < TOTAL_CLAUSES - 1:
                 st.button("Next Clause", on_click=next_clause)
             else:
                 st.button("View Results", on_click=next_clause)
@@ -442,101 +539,4 @@ else:
 
 # Add an insights section on the sidebar
 with st.sidebar:
-    st.title("ISO 27001 Insights")
-    
-    # Show current clause insights
-    if st.session_state.clause_idx < total_clauses:
-        cid = clause_ids[st.session_state.clause_idx]
-        
-        # Display clause tips
-        st.subheader(f"Tips for Clause {cid}")
-        
-        # Define tips for specific clauses
-        clause_tips = {
-            "4.1": [
-                "Consider both internal factors (organization structure, governance) and external factors (regulatory, technological, competitive landscape).",
-                "Document how these issues might affect your information security objectives.",
-                "Review these issues periodically, especially when significant changes occur."
-            ],
-            "4.2": [
-                "Include stakeholders such as customers, employees, regulators, and suppliers.",
-                "Document their specific security requirements and expectations.",
-                "Establish a process for monitoring changes in stakeholder requirements."
-            ],
-            "4.3": [
-                "Define physical locations, organizational functions, and technical boundaries.",
-                "Justify any exclusions from the scope.",
-                "Ensure interfaces and dependencies with out-of-scope activities are addressed."
-            ],
-            "4.4": [
-                "Ensure top management support and sufficient resources.",
-                "Define clear responsibilities for the ISMS.",
-                "Implement processes for continual improvement based on risk assessment and effectiveness measurement."
-            ]
-        }
-        
-        # Display relevant tips
-        if cid in clause_tips:
-            for tip in clause_tips[cid]:
-                st.info(tip)
-        
-        # Display common pitfalls
-        st.subheader("Common Pitfalls")
-        common_pitfalls = {
-            "4.1": [
-                "Failing to consider both internal and external issues",
-                "Not documenting how issues affect information security",
-                "Conducting the analysis only once without regular reviews"
-            ],
-            "4.2": [
-                "Identifying too few stakeholders",
-                "Omitting legal and regulatory requirements",
-                "Not having a process to update requirements when they change"
-            ],
-            "4.3": [
-                "Defining the scope too broadly or too narrowly",
-                "Not documenting justifications for exclusions",
-                "Failing to consider dependencies with third parties"
-            ],
-            "4.4": [
-                "Insufficient management commitment",
-                "Unclear responsibilities and authorities",
-                "Lack of documented processes for ISMS improvement"
-            ]
-        }
-        
-        if cid in common_pitfalls:
-            for pitfall in common_pitfalls[cid]:
-                st.warning(pitfall)
-    
-    # Show overall progress
-    st.subheader("Assessment Progress")
-    completed = sum(1 for _ in st.session_state.responses.items())
-    st.progress(completed / total_clauses, text=f"{completed}/{total_clauses} clauses assessed")
-    
-    # Show completed clauses
-    if completed > 0:
-        st.subheader("Completed Clauses")
-        for cid, verdict in st.session_state.responses.items():
-            if verdict == "Complied":
-                st.success(f"✓ {cid}")
-            elif verdict in ("Minor NC", "Opportunity for Improvement"):
-                st.warning(f"⚠ {cid}")
-            else:
-                st.error(f"✗ {cid}")
-
-    # Add quick reference
-    with st.expander("ISO 27001 Quick Reference"):
-        st.write("""
-        **Clause 4: Context of the Organization**
-        - 4.1: Understanding the organization and its context
-        - 4.2: Understanding the needs and expectations of interested parties
-        - 4.3: Determining the scope of the ISMS
-        - 4.4: Information security management system
-        
-        **Key ISO 27001 Terms:**
-        - ISMS: Information Security Management System
-        - Risk: Effect of uncertainty on objectives
-        - Asset: Anything that has value to the organization
-        - Control: Measure that modifies risk
-        """)
+    render_sidebar()
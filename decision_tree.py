@@ -1,4 +1,5 @@
-from typing import Dict, Any, Union, List
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Sequence, Union, List, Tuple
 
 # Detailed decision tree for ISO 27001 Clause 4
 # Each clause defines a sequence of numbered questions (steps) with options leading to next steps or verdicts.
@@ -167,35 +168,160 @@ decision_trees: Dict[str, Dict[str, Any]] = {
 }
 
 
+# Clause order and count, fixed at import
+CLAUSE_IDS: Tuple[str, ...] = tuple(decision_trees)
+TOTAL_CLAUSES = len(CLAUSE_IDS)
+
+# Requirement text shown in open-ended mode
+CLAUSE_REQUIREMENTS: Dict[str, str] = {
+    "4.1": "The organization shall determine external and internal issues relevant to its purpose and strategic direction that affect its ability to achieve the intended outcome(s) of its ISMS.",
+    "4.2": "The organization shall determine interested parties relevant to the ISMS, and their requirements.",
+    "4.3": "The organization shall determine the boundaries and applicability of the ISMS to establish its scope.",
+    "4.4": "The organization shall establish, implement, maintain and continually improve an ISMS."
+}
+
+# Sidebar guidance shown alongside each clause
+CLAUSE_TIPS: Dict[str, List[str]] = {
+    "4.1": [
+        "Consider both internal factors (organization structure, governance) and external factors (regulatory, technological, competitive landscape).",
+        "Document how these issues might affect your information security objectives.",
+        "Review these issues periodically, especially when significant changes occur."
+    ],
+    "4.2": [
+        "Include stakeholders such as customers, employees, regulators, and suppliers.",
+        "Document their specific security requirements and expectations.",
+        "Establish a process for monitoring changes in stakeholder requirements."
+    ],
+    "4.3": [
+        "Define physical locations, organizational functions, and technical boundaries.",
+        "Justify any exclusions from the scope.",
+        "Ensure interfaces and dependencies with out-of-scope activities are addressed."
+    ],
+    "4.4": [
+        "Ensure top management support and sufficient resources.",
+        "Define clear responsibilities for the ISMS.",
+        "Implement processes for continual improvement based on risk assessment and effectiveness measurement."
+    ]
+}
+
+COMMON_PITFALLS: Dict[str, List[str]] = {
+    "4.1": [
+        "Failing to consider both internal and external issues",
+        "Not documenting how issues affect information security",
+        "Conducting the analysis only once without regular reviews"
+    ],
+    "4.2": [
+        "Identifying too few stakeholders",
+        "Omitting legal and regulatory requirements",
+        "Not having a process to update requirements when they change"
+    ],
+    "4.3": [
+        "Defining the scope too broadly or too narrowly",
+        "Not documenting justifications for exclusions",
+        "Failing to consider dependencies with third parties"
+    ],
+    "4.4": [
+        "Insufficient management commitment",
+        "Unclear responsibilities and authorities",
+        "Lack of documented processes for ISMS improvement"
+    ]
+}
+
+# Flat view of decision_trees, built once at import:
+# (clause, step) -> (question, option texts, targets in option order)
+_CANON: Dict[Union[str, Tuple[str, ...]], Union[str, Tuple[str, ...]]] = {}
+
+
+def _verdict_key(verdict: Union[str, List[str]]) -> Union[str, Tuple[str, ...]]:
+    """Return the single shared str/tuple object for a verdict value."""
+    key = verdict if isinstance(verdict, str) else tuple(verdict)
+    return _CANON.setdefault(key, key)
+
+
+# One read-only verdict payload per distinct verdict, shared by every leaf;
+# combined verdicts such as ("Minor NC", "OFI") are tuples
+_V: Dict[Union[str, Tuple[str, ...]], Mapping[str, Any]] = {
+    key: MappingProxyType({"verdict": key})
+    for key in (
+        _verdict_key(target["verdict"])
+        for tree in decision_trees.values()
+        for s in tree["steps"].values()
+        for target in s["options"].values()
+        if isinstance(target, dict)
+    )
+}
+
+
+def _leaf(target: Any) -> Any:
+    return target if isinstance(target, str) else _V[_verdict_key(target["verdict"])]
+
+
+_FLAT: Dict[Tuple[str, str], Tuple[str, Tuple[str, ...], Tuple[Any, ...]]] = {
+    (cid, step): (s["question"], tuple(s["options"]), tuple(map(_leaf, s["options"].values())))
+    for cid, tree in decision_trees.items()
+    for step, s in tree["steps"].items()
+}
+
+# (clause, step, answer) -> target, so evaluating an answer is one lookup
+_TRANSITIONS: Dict[Tuple[str, str, str], Any] = {
+    (cid, step, answer): target
+    for (cid, step), (_, opts, targets) in _FLAT.items()
+    for answer, target in zip(opts, targets)
+}
+
+# (clause, step) pairs whose options lead to a verdict
+TERMINAL_STEPS = frozenset(
+    key
+    for key, (_, _, targets) in _FLAT.items()
+    if any(not isinstance(t, str) for t in targets)
+)
+
+
 def get_question(clause_id: str, step: str) -> str:
     """Return the question text for a given clause and step."""
-    tree = decision_trees.get(clause_id)
-    if not tree or step not in tree["steps"]:
-        raise KeyError(f"Question not found for clause {clause_id}, step {step}")
-    return tree["steps"][step]["question"]
+    try:
+        return _FLAT[(clause_id, step)][0]
+    except KeyError:
+        raise KeyError(f"Question not found for clause {clause_id}, step {step}") from None
 
 
-def get_options(clause_id: str, step: str) -> List[str]:
-    """Return list of option texts for a given clause and step."""
-    opts = decision_trees[clause_id]["steps"][step]["options"]
-    return list(opts.keys())
+def get_options(clause_id: str, step: str) -> Tuple[str, ...]:
+    """Return option texts for a given clause and step."""
+    return _FLAT[(clause_id, step)][1]
 
 
 def evaluate_answer(
     clause_id: str,
     step: str,
     answer: str
-) -> Union[str, Dict[str, Any]]:
+) -> Union[str, Mapping[str, Any]]:
     """
     Evaluate an answer to a given question.
     Returns next step (as string) if continuing,
-    or a verdict dict if terminal.
+    or a shared read-only verdict mapping if terminal.
     """
-    opts = decision_trees[clause_id]["steps"][step]["options"]
-    if answer not in opts:
+    target = _TRANSITIONS.get((clause_id, step, answer))
+    if target is None:
+        if (clause_id, step) not in _FLAT:
+            raise KeyError(f"Question not found for clause {clause_id}, step {step}")
         raise ValueError(f"Invalid answer '{answer}' for clause {clause_id}, step {step}")
-    target = opts[answer]
-    if isinstance(target, str):
-        return target  # next step number
-    # terminal
-    return {"verdict": target["verdict"]}
+    return target  # next step number, or the shared verdict mapping
+
+
+def evaluate_many(
+    clause_ids: Sequence[str],
+    steps: Sequence[str],
+    answers: Sequence[str]
+) -> List[Union[str, Mapping[str, Any]]]:
+    """
+    Evaluate parallel sequences of (clause, step, answer), e.g. when replaying
+    recorded assessments. Each result is what evaluate_answer would return,
+    and the same errors are raised for unknown steps or answers. Sequences of
+    different lengths raise ValueError rather than dropping entries.
+    """
+    results = list(map(_TRANSITIONS.get, zip(clause_ids, steps, answers, strict=True)))
+    if None in results:
+        # report the first bad entry the same way a single evaluation would
+        i = results.index(None)
+        evaluate_answer(clause_ids[i], steps[i], answers[i])
+    return results
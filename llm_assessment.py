@@ -1,28 +1,107 @@
 # llm_assessment.py
 
 import os
+import re
 import json
-from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Any, Mapping, Optional, Tuple
+import httpx2
+import streamlit as st
+from openai import DefaultHttpxClient, OpenAI
 from utils import score_to_verdict
 
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-if not DEEPSEEK_API_KEY:
-    raise ValueError("DEEPSEEK_API_KEY environment variable is not set")
+log = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def get_llm_client() -> OpenAI:
+    """
+    Return the DeepSeek client shared across reruns and sessions.
+    Built on first use, so importing this module needs no API key.
+    """
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        # not cached, so the next call retries once the key is set
+        raise ValueError("DEEPSEEK_API_KEY environment variable is not set")
+    # One pooled HTTP/2 connection set, so concurrent calls reuse TLS sessions
+    http_client = DefaultHttpxClient(
+        http2=True,
+        limits=httpx2.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=httpx2.Timeout(60.0, connect=5.0),
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url="https://api.deepseek.com",
+        http_client=http_client,
+    )
+
+
+# LLM results are cached for a day so Streamlit reruns never repeat an API call
+LLM_CACHE_TTL = 24 * 60 * 60
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalized_cache_key(text: str) -> bytes:
+    """Hash text arguments by content, ignoring differences in whitespace."""
+    return _WHITESPACE_RE.sub(" ", text).strip().encode()
+
+
+# Inputs that only differ in spacing/line breaks share one cache entry
+LLM_CACHE_HASH_FUNCS = {str: _normalized_cache_key}
+
+# Larger assessments are split into batches of this many clauses, and the
+# batches are requested concurrently
+RECOMMENDATION_BATCH_SIZE = 8
+MAX_CONCURRENT_REQUESTS = 10
+
+# Input budgets in UTF-8 bytes, which track billed tokens far better than
+# characters (~4 bytes per token, so roughly 4000 tokens each)
+DOCUMENT_BYTE_LIMIT = 16000
+RESPONSE_BYTE_LIMIT = 16000
+
+# Finished assistant replies kept across sessions (least recently used dropped first)
+ASSISTANT_REPLY_CACHE_SIZE = 256
+
+
+def _map_concurrently(fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+    """
+    Apply fn to each item on a thread pool, preserving order.
+    The SDK is synchronous but releases the GIL while waiting on the network.
+    """
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    """
+    Cut text to at most max_bytes of UTF-8 (plus "..."), never splitting a character.
+    """
+    # A character is at least one byte, so anything past max_bytes chars is cut anyway
+    head = text[:max_bytes + 1]
+    data = head.encode("utf-8")
+    if len(data) <= max_bytes and len(head) == len(text):
+        return text
+    return data[:max_bytes].decode("utf-8", "ignore") + "..."
+
+
+# Optional ```json ... ``` fence around the body; group 1 is the JSON itself.
+_FENCE_RE = re.compile(r"^\s*(?:```(?:json)?\s*)?(.*?)(?:\s*```)?\s*$", re.DOTALL)
 
-client = OpenAI(
-    api_key=DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com", 
-)
 
 def safe_load_json(content: str, context: str) -> Any:
     """
     Strip markdown fences, ensure non-empty, then parse JSON.
     Raises a clear ValueError if parsing fails.
     """
-    s = content.strip()
-    if s.startswith("```"):
-        s = s.lstrip("```").lstrip("json").rstrip("```").strip()
+    s = _FENCE_RE.match(content).group(1)
     if not s:
         raise ValueError(f"[safe_load_json] Empty response for context:\n{context!r}")
     try:
@@ -30,6 +109,82 @@ def safe_load_json(content: str, context: str) -> Any:
     except json.JSONDecodeError as e:
         raise ValueError(f"[safe_load_json] JSONDecodeError for context {context!r}: {e}\nContent was:\n{s!r}")
 
+
+class _JsonObjectScanner:
+    """
+    Track streamed text until the first top-level JSON object is complete.
+    Anything other than whitespace or an opening ```json fence before the
+    first '{' is rejected as soon as it appears.
+    """
+
+    def __init__(self) -> None:
+        self.prefix = ""
+        self.parts: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str) -> bool:
+        """Consume a chunk; return True once the object has closed."""
+        if not self.depth:
+            start = text.find("{")
+            head = text if start < 0 else text[:start]
+            self.prefix += head
+            if not "```json".startswith(self.prefix.strip().lower()):
+                raise ValueError(f"Expected a JSON object, got {self.prefix[:80]!r}")
+            if start < 0:
+                return False
+            text = text[start:]
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if not self.depth:
+                    self.parts.append(text[:i + 1])
+                    return True
+        self.parts.append(text)
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _stream_json_text(messages: List[Dict[str, str]], max_tokens: int, **kwargs: Any) -> str:
+    """
+    Stream a completion that should be a single JSON object and return its text.
+    The stream is closed as soon as the object is complete, or as soon as the
+    output is clearly not JSON.
+    """
+    scanner = _JsonObjectScanner()
+    stream = get_llm_client().chat.completions.create(
+        model="deepseek-chat",
+        messages=messages,
+        temperature=0,
+        max_tokens=max_tokens,
+        stream=True,
+        **kwargs
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if scanner.feed(chunk.choices[0].delta.content):
+                    break
+    finally:
+        stream.close()
+    return scanner.text
+
+
 CLAUSE_DESCRIPTIONS = {
     "4.1": "Understanding the organization and its context requires identifying external and internal issues relevant to the organization's purpose that affect its ability to achieve intended ISMS outcomes.",
     "4.2": "Understanding the needs and expectations of interested parties requires determining relevant stakeholders and their requirements.",
@@ -37,17 +192,8 @@ CLAUSE_DESCRIPTIONS = {
     "4.4": "The ISMS must be established, implemented, maintained and continually improved in accordance with ISO 27001."
 }
 
-
-def analyze_uploaded_evidence(
-    clause_id: str,
-    document_text: str
-) -> Dict[str, Any]:
-    clause_desc = CLAUSE_DESCRIPTIONS.get(clause_id, f"ISO 27001 Clause {clause_id}")
-    # truncate if too long
-    if len(document_text) > 6000:
-        document_text = document_text[:6000] + "..."
-
-    system_prompt = """
+# Prompts and per-clause headers are built once; each call only adds its own content
+_SYS_ANALYZE = """
 You are an ISO 27001 compliance auditor specializing in document review.
 Your task is to evaluate the provided document content based on the given ISO clause.
 
@@ -62,79 +208,131 @@ Your task is to evaluate the provided document content based on the given ISO cl
 Make sure your JSON is syntactically valid.
 """
 
+_SYS_EVAL = """
+You are an ISO 27001 auditor assessing a user's open-ended answer.
+
+Evaluate the response for relevance and completeness regarding the given clause.
+
+**IMPORTANT:** Output ONLY a valid JSON object using this exact schema:
+{
+  "scores": {
+    "relevance": <0.0-1.0>,
+    "completeness": <0.0-1.0>
+  },
+  "verdict": "Complied|Minor NC|Opportunity for Improvement|Major NC",
+  "feedback": "<detailed constructive feedback>"
+}
+
+Do not add any explanation or notes. Ensure the JSON is valid and fully populated.
+"""
+
+_SYS_RECS = """
+You are an ISO 27001 consultant reviewing an organization's overall gap assessment results.
+
+Based on the provided data, generate improvement strategies and actionable recommendations.
+
+**IMPORTANT:** Respond ONLY with a valid JSON object using this schema:
+{
+  "priority_actions": [...],
+  "recommendations_by_clause": {
+    "<clause id>": {"actions": [...], "timeline": "...", "resources": [...]}
+  },
+  "implementation_strategy": "...",
+  "areas_of_strength": [...]
+}
+
+Include one "recommendations_by_clause" entry for every clause id in the assessment results.
+No explanations outside the JSON output. Make sure the JSON is properly formatted and complete.
+"""
+
+_SYS_CHAT = """
+You are an ISO 27001 virtual assistant.
+
+Provide practical, concise advice in natural language to answer user questions.
+Whenever relevant, cite ISO clause numbers (e.g., "Refer to Clause 4.1.").
+
+**IMPORTANT:** Respond in plain text only (no JSON), and avoid unnecessary verbosity.
+Focus on clarity, relevance, and actionable guidance.
+"""
+
+_SYS_ANALYZE_MSG = {"role": "system", "content": _SYS_ANALYZE}
+_SYS_EVAL_MSG = {"role": "system", "content": _SYS_EVAL}
+_SYS_RECS_MSG = {"role": "system", "content": _SYS_RECS}
+_SYS_CHAT_MSG = {"role": "system", "content": _SYS_CHAT}
+
+_CLAUSE_HEADER: Dict[str, Dict[str, str]] = {
+    cid: {"role": "user", "content": f"Clause {cid}: {desc}"}
+    for cid, desc in CLAUSE_DESCRIPTIONS.items()
+}
+
+
+def _clause_messages(system_message: Dict[str, str], clause_id: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Return the (system, clause header) messages that open a per-clause request."""
+    header = _CLAUSE_HEADER.get(clause_id) or {
+        "role": "user", "content": f"Clause {clause_id}: ISO 27001 Clause {clause_id}"
+    }
+    return system_message, header
+
+
+@st.cache_data(ttl=LLM_CACHE_TTL, show_spinner=False, hash_funcs=LLM_CACHE_HASH_FUNCS)
+def analyze_uploaded_evidence(
+    clause_id: str,
+    document_text: str
+) -> Dict[str, Any]:
+    # truncate if too long
+    document_text = _truncate_utf8(document_text, DOCUMENT_BYTE_LIMIT)
 
     messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Clause {clause_id}: {clause_desc}"},
+        *_clause_messages(_SYS_ANALYZE_MSG, clause_id),
         {"role": "user", "content": f"Document content:\n\n{document_text}"}
     ]
 
     try:
-        resp = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0,
-            max_tokens=800,
-            stream=False
-        )
-        raw = resp.choices[0].message.content or ""
-        print(f"[DEBUG] analyze_uploaded_evidence raw response for {clause_id!r}:\n{raw!r}")
+        raw = _stream_json_text(messages, max_tokens=800)
+        log.debug("analyze_uploaded_evidence raw response for %r:\n%r", clause_id, raw)
         return safe_load_json(raw, f"analyze_uploaded_evidence({clause_id})")
     except Exception as e:
         # Let the exception bubble so you see it in Streamlit logs
         raise RuntimeError(f"[analyze_uploaded_evidence] {e}")
 
 
+# Shared result for blank answers; returned before the cache, which would
+# have to pickle (and so could not hold) the read-only scores mapping
+_EMPTY_RESULT: Tuple[str, Mapping[str, float], str] = (
+    "Major NC",
+    MappingProxyType({"relevance": 0.0, "completeness": 0.0}),
+    "No response provided"
+)
+
+
 def evaluate_open_text_compliance(
     clause_id: str,
     user_response: str,
     document_context: Optional[str] = None
-) -> Tuple[str, Dict[str, float], str]:
-    clause_desc = CLAUSE_DESCRIPTIONS.get(clause_id, f"ISO 27001 Clause {clause_id}")
-
-    if not user_response or not user_response.strip():
-        return "Major NC", {"relevance": 0.0, "completeness": 0.0}, "No response provided"
-
-    if len(user_response) > 4000:
-        user_response = user_response[:4000] + "..."
-
-    system_prompt = """
-You are an ISO 27001 auditor assessing a user's open-ended answer.
-
-Evaluate the response for relevance and completeness regarding the given clause.
-
-**IMPORTANT:** Output ONLY a valid JSON object using this exact schema:
-{
-  "scores": {
-    "relevance": <0.0-1.0>,
-    "completeness": <0.0-1.0>
-  },
-  "verdict": "Complied|Minor NC|Opportunity for Improvement|Major NC",
-  "feedback": "<detailed constructive feedback>"
-}
+) -> Tuple[str, Mapping[str, float], str]:
+    if not user_response or user_response.isspace():
+        return _EMPTY_RESULT
+    return _evaluate_open_text_compliance(clause_id, user_response, document_context)
 
-Do not add any explanation or notes. Ensure the JSON is valid and fully populated.
-"""
 
+@st.cache_data(ttl=LLM_CACHE_TTL, show_spinner=False, hash_funcs=LLM_CACHE_HASH_FUNCS)
+def _evaluate_open_text_compliance(
+    clause_id: str,
+    user_response: str,
+    document_context: Optional[str] = None
+) -> Tuple[str, Dict[str, float], str]:
+    user_response = _truncate_utf8(user_response, RESPONSE_BYTE_LIMIT)
 
     messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Clause {clause_id}: {clause_desc}"},
+        *_clause_messages(_SYS_EVAL_MSG, clause_id),
         {"role": "user", "content": f"User response:\n\n{user_response}"}
     ]
     if document_context:
         messages.append({"role": "user", "content": f"Supporting docs:\n\n{document_context}"})
 
     try:
-        resp = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0,
-            max_tokens=800,
-            stream=False
-        )
-        raw = resp.choices[0].message.content or ""
-        print(f"[DEBUG] evaluate_open_text_compliance raw for {clause_id!r}:\n{raw!r}")
+        raw = _stream_json_text(messages, max_tokens=800)
+        log.debug("evaluate_open_text_compliance raw for %r:\n%r", clause_id, raw)
         result = safe_load_json(raw, f"evaluate_open_text_compliance({clause_id})")
         scores = result.get("scores", {})
         verdict = result.get("verdict") or score_to_verdict(
@@ -147,77 +345,142 @@ Do not add any explanation or notes. Ensure the JSON is valid and fully populate
         raise RuntimeError(f"[evaluate_open_text_compliance] {e}")
 
 
-def generate_detailed_recommendations(
+def evaluate_all_clauses(
+    pairs: List[Tuple[str, str]],
+    document_context: Optional[Dict[str, str]] = None
+) -> List[Tuple[str, Mapping[str, float], str]]:
+    """
+    Evaluate several (clause_id, user_response) pairs concurrently.
+    Results are returned in the same order as pairs.
+    """
+    document_context = document_context or {}
+    return _map_concurrently(
+        lambda pair: evaluate_open_text_compliance(pair[0], pair[1], document_context.get(pair[0])),
+        pairs
+    )
+
+
+def _request_recommendations(
     assessment_results: List[Dict[str, Any]],
     organization_context: Optional[str] = None
 ) -> Dict[str, Any]:
-    formatted = json.dumps(assessment_results, indent=2)
+    # Compact separators: the model does not need the indentation, and it costs tokens
+    formatted = json.dumps(assessment_results, separators=(",", ":"), ensure_ascii=False)
     context_prompt = f"Organization context:\n{organization_context}\n\n" if organization_context else ""
-    system_prompt = """
-You are an ISO 27001 consultant reviewing an organization's overall gap assessment results.
-
-Based on the provided data, generate improvement strategies and actionable recommendations.
-
-**IMPORTANT:** Respond ONLY with a valid JSON object using this schema:
-{
-  "priority_actions": [...],
-  "recommendations_by_clause": {...},
-  "implementation_strategy": "...",
-  "areas_of_strength": [...]
-}
-
-No explanations outside the JSON output. Make sure the JSON is properly formatted and complete.
-"""
-
-
     messages = [
-        {"role": "system", "content": system_prompt},
+        _SYS_RECS_MSG,
         {"role": "user", "content": context_prompt + "Assessment results:\n" + formatted}
     ]
 
     try:
-        resp = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0,
-            max_tokens=800,
-            stream=False
-        )
-        raw = resp.choices[0].message.content or ""
-        print(f"[DEBUG] generate_detailed_recommendations raw:\n{raw!r}")
+        raw = _stream_json_text(messages, max_tokens=800, response_format={"type": "json_object"})
+        log.debug("generate_detailed_recommendations raw:\n%r", raw)
         return safe_load_json(raw, "generate_detailed_recommendations")
     except Exception as e:
         raise RuntimeError(f"[generate_detailed_recommendations] {e}")
 
 
-def ai_assistant_response(
-    user_query: str,
-    clause_context: Optional[str] = None
-) -> str:
-    context = f"Regarding clause: {clause_context}\n\n" if clause_context else ""
-    system_prompt = """
-You are an ISO 27001 virtual assistant.
+def _merge_recommendations(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the recommendations returned for separate clause batches."""
+    merged: Dict[str, Any] = {
+        "priority_actions": [],
+        "recommendations_by_clause": {},
+        "areas_of_strength": []
+    }
+    strategies = []
+    for part in parts:
+        merged["priority_actions"].extend(part.get("priority_actions", []))
+        merged["recommendations_by_clause"].update(part.get("recommendations_by_clause", {}))
+        merged["areas_of_strength"].extend(part.get("areas_of_strength", []))
+        if part.get("implementation_strategy"):
+            strategies.append(part["implementation_strategy"])
+    if strategies:
+        merged["implementation_strategy"] = "\n\n".join(strategies)
+    return merged
+
+
+@st.cache_data(ttl=LLM_CACHE_TTL, show_spinner=False, hash_funcs=LLM_CACHE_HASH_FUNCS)
+def generate_detailed_recommendations(
+    assessment_results: List[Dict[str, Any]],
+    organization_context: Optional[str] = None
+) -> Dict[str, Any]:
+    if len(assessment_results) <= RECOMMENDATION_BATCH_SIZE:
+        return _request_recommendations(assessment_results, organization_context)
 
-Provide practical, concise advice in natural language to answer user questions.
-Whenever relevant, cite ISO clause numbers (e.g., "Refer to Clause 4.1.").
+    batches = [
+        assessment_results[i:i + RECOMMENDATION_BATCH_SIZE]
+        for i in range(0, len(assessment_results), RECOMMENDATION_BATCH_SIZE)
+    ]
+    parts = _map_concurrently(
+        lambda batch: _request_recommendations(batch, organization_context),
+        batches
+    )
+    return _merge_recommendations(parts)
 
-**IMPORTANT:** Respond in plain text only (no JSON), and avoid unnecessary verbosity.
-Focus on clarity, relevance, and actionable guidance.
-"""
 
+def stream_ai_assistant_response(
+    user_query: str,
+    clause_context: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Yield the assistant's plain-text reply chunk by chunk as it is generated.
+    Errors propagate to the caller so a failed reply is never remembered.
+    """
+    context = f"Regarding clause: {clause_context}\n\n" if clause_context else ""
     messages = [
-        {"role": "system", "content": system_prompt},
+        _SYS_CHAT_MSG,
         {"role": "user", "content": context + "User question: " + user_query}
     ]
 
-    try:
-        resp = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0,
-            max_tokens=500,
-            stream=False
-        )
-        return resp.choices[0].message.content
-    except Exception as e:
-        return f"I'm sorry, I can't process that right now: {e}"
+    stream = get_llm_client().chat.completions.create(
+        model="deepseek-chat",
+        messages=messages,
+        temperature=0,
+        max_tokens=500,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+@st.cache_resource
+def _assistant_reply_store() -> "OrderedDict[Tuple[bytes, bytes], Tuple[float, str]]":
+    """Process-wide store of finished replies; key -> (expiry time, reply)."""
+    return OrderedDict()
+
+
+_ASSISTANT_REPLY_LOCK = threading.Lock()
+
+
+def _assistant_reply_key(user_query: str, clause_context: Optional[str]) -> Tuple[bytes, bytes]:
+    return _normalized_cache_key(user_query), _normalized_cache_key(clause_context or "")
+
+
+def get_cached_assistant_reply(user_query: str, clause_context: Optional[str] = None) -> Optional[str]:
+    """
+    Return a finished reply to the same question from any session, or None.
+    Entries expire after LLM_CACHE_TTL like the st.cache_data results.
+    """
+    key = _assistant_reply_key(user_query, clause_context)
+    store = _assistant_reply_store()
+    with _ASSISTANT_REPLY_LOCK:
+        entry = store.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return entry[1]
+
+
+def remember_assistant_reply(user_query: str, clause_context: Optional[str], reply: str) -> None:
+    """Store a completely streamed reply for get_cached_assistant_reply."""
+    key = _assistant_reply_key(user_query, clause_context)
+    store = _assistant_reply_store()
+    with _ASSISTANT_REPLY_LOCK:
+        store[key] = (time.monotonic() + LLM_CACHE_TTL, reply)
+        store.move_to_end(key)
+        while len(store) > ASSISTANT_REPLY_CACHE_SIZE:
+            store.popitem(last=False)
@@ -1,10 +1,16 @@
-from typing import Dict, Any, List
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Tuple, Union
+
+import numpy as np
 
 # Thresholds untuk mapping skor ke verdict
 COMPLIED_THRESHOLD = 0.85
 MINOR_NC_THRESHOLD = 0.7
 MAJOR_NC_THRESHOLD = 0.6
 
+# Verdict per jumlah threshold yang dilewati skor terendah
+_VERDICT_BY_LEVEL = ("Major NC", "Opportunity for Improvement", "Minor NC", "Complied")
+
 
 def score_to_verdict(relevance: float, completeness: float) -> str:
     """
@@ -15,62 +21,106 @@ def score_to_verdict(relevance: float, completeness: float) -> str:
     - Opportunity for Improvement: one >= MINOR_NC_THRESHOLD
     - Major NC: otherwise
     """
-    if relevance >= COMPLIED_THRESHOLD and completeness >= COMPLIED_THRESHOLD:
-        return "Complied"
-    if relevance < MAJOR_NC_THRESHOLD or completeness < MAJOR_NC_THRESHOLD:
-        return "Major NC"
-    if relevance >= MINOR_NC_THRESHOLD and completeness >= MINOR_NC_THRESHOLD:
-        return "Minor NC"
-    return "Opportunity for Improvement"
+    # Skor terendah menentukan level: jumlah threshold yang dilewati (0..3)
+    lowest = min(relevance, completeness)
+    # int() agar skor numpy (np.bool_ dijumlah sebagai OR) tetap menghasilkan angka
+    level = (
+        int(lowest >= MAJOR_NC_THRESHOLD)
+        + int(lowest >= MINOR_NC_THRESHOLD)
+        + int(lowest >= COMPLIED_THRESHOLD)
+    )
+    return _VERDICT_BY_LEVEL[level]
+
+
+def score_to_verdict_batch(relevance: Any, completeness: Any) -> List[str]:
+    """
+    Versi vektor dari score_to_verdict untuk array skor (list atau NumPy array).
+    """
+    lowest = np.minimum(np.asarray(relevance, dtype=float), np.asarray(completeness, dtype=float))
+    levels = (
+        (lowest >= MAJOR_NC_THRESHOLD).astype(np.int8)
+        + (lowest >= MINOR_NC_THRESHOLD)
+        + (lowest >= COMPLIED_THRESHOLD)
+    )
+    return [_VERDICT_BY_LEVEL[i] for i in levels.ravel().tolist()]
 
 
-def generate_gap_analysis(clause_id: str, verdict: str, details: Dict[str, Any]) -> Dict[str, Any]:
+@dataclass(slots=True, frozen=True)
+class Analysis:
+    """
+    Hasil analisis gap untuk satu klausul.
+    """
+    clause: str
+    verdict: Union[str, Tuple[str, ...]]
+    details: Dict[str, Any] = field(default_factory=dict)
+
+
+def generate_gap_analysis(
+    clause_id: str,
+    verdict: Union[str, Tuple[str, ...]],
+    details: Dict[str, Any]
+) -> Analysis:
     """
     Buat analisis gap untuk satu klausul.
     """
-    return {
-        "clause": clause_id,
-        "verdict": verdict,
-        "details": details
-    }
+    return Analysis(clause_id, verdict, details)
+
+
+# Saran perbaikan per verdict; verdict lain (termasuk verdict gabungan) memakai saran Major NC
+_MAJOR_NC_RECS: Tuple[str, ...] = (
+    "Segera implementasikan proses sesuai klausul yang belum ada.",
+    "Susun dan dokumentasikan prosedur dasar untuk kepatuhan awal.",
+)
+_RECS_BY_VERDICT: Dict[str, Tuple[str, ...]] = {
+    "Complied": ("Pertahankan praktik yang telah berjalan dengan baik.",),
+    "Minor NC": (
+        "Perbaiki detail yang kurang untuk memenuhi standar penuh.",
+        "Tinjau kembali dokumentasi dan lengkapi bagian yang belum memadai.",
+    ),
+    "Opportunity for Improvement": (
+        "Pertimbangkan untuk meningkatkan proses meski sudah memenuhi syarat minimal.",
+        "Tuliskan prosedur lebih rinci untuk meningkatkan konsistensi implementasi.",
+    ),
+    "Major NC": _MAJOR_NC_RECS,
+}
+_ALL_COMPLIED = "Semua klausul telah terpenuhi. Tidak ada tindakan tambahan yang diperlukan."
+
+
+def _recommendations_for(verdict: Any) -> Tuple[str, ...]:
+    # verdict gabungan (mis. ("Minor NC", "OFI")) sengaja mendapat saran Major NC
+    if not isinstance(verdict, str):
+        return _MAJOR_NC_RECS
+    return _RECS_BY_VERDICT.get(verdict, _MAJOR_NC_RECS)
+
 
+def _checklist_line(clause: Any, verdict: Any) -> str:
+    # verdict gabungan dari decision tree berupa tuple; tampilkan seperti list
+    if isinstance(verdict, tuple):
+        verdict = list(verdict)
+    return f"Tinjau dan perbaiki klausul {clause}: verdict = {verdict}"
 
-def generate_recommendations(analysis: Dict[str, Any]) -> List[str]:
+
+def generate_recommendations(analysis: Analysis) -> List[str]:
     """
     Saran perbaikan berdasarkan verdict.
     """
-    v = analysis.get("verdict")
-    recs = []
-    if v == "Complied":
-        recs.append("Pertahankan praktik yang telah berjalan dengan baik.")
-    elif v == "Minor NC":
-        recs.append("Perbaiki detail yang kurang untuk memenuhi standar penuh.")
-        recs.append("Tinjau kembali dokumentasi dan lengkapi bagian yang belum memadai.")
-    elif v == "Opportunity for Improvement":
-        recs.append("Pertimbangkan untuk meningkatkan proses meski sudah memenuhi syarat minimal.")
-        recs.append("Tuliskan prosedur lebih rinci untuk meningkatkan konsistensi implementasi.")
-    else:  # Major NC
-        recs.append("Segera implementasikan proses sesuai klausul yang belum ada.")
-        recs.append("Susun dan dokumentasikan prosedur dasar untuk kepatuhan awal.")
-    return recs
-
-
-def generate_checklist(analysis_list: List[Dict[str, Any]]) -> List[str]:
+    return list(_recommendations_for(analysis.verdict))
+
+
+def generate_checklist(analysis_list: List[Analysis]) -> List[str]:
     """
     Buat checklist mitigasi dari kumpulan analisis.
     """
     checklist = []
     for analysis in analysis_list:
-        clause = analysis.get("clause")
-        verdict = analysis.get("verdict")
-        if verdict != "Complied":
-            checklist.append(f"Tinjau dan perbaiki klausul {clause}: verdict = {verdict}")
+        if analysis.verdict != "Complied":
+            checklist.append(_checklist_line(analysis.clause, analysis.verdict))
     if not checklist:
-        checklist.append("Semua klausul telah terpenuhi. Tidak ada tindakan tambahan yang diperlukan.")
+        checklist.append(_ALL_COMPLIED)
     return checklist
 
 
-def compile_report(analysis_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+def compile_report(analysis_list: List[Analysis]) -> Dict[str, Any]:
     """
     Buat laporan lengkap dari hasil analisis.
 
@@ -79,15 +129,18 @@ def compile_report(analysis_list: List[Dict[str, Any]]) -> Dict[str, Any]:
     - recommendations: list rekomendasi global
     - checklist: list checklist mitigasi
     """
-    # Gabungkan rekomendasi dari tiap klausul
-    all_recs = []
+    # Satu kali jalan: rekomendasi unik (urutan tetap) dan checklist sekaligus
+    recs: Dict[str, None] = {}
+    checklist = []
     for a in analysis_list:
-        all_recs.extend(generate_recommendations(a))
-    # Hapus duplikat
-    recommendations = list(dict.fromkeys(all_recs))
-    checklist = generate_checklist(analysis_list)
+        for r in _recommendations_for(a.verdict):
+            recs[r] = None
+        if a.verdict != "Complied":
+            checklist.append(_checklist_line(a.clause, a.verdict))
+    if not checklist:
+        checklist.append(_ALL_COMPLIED)
     return {
         "gap_analysis": analysis_list,
-        "recommendations": recommendations,
+        "recommendations": list(recs),
         "checklist": checklist
     }